@@ -26,6 +26,10 @@ class IntFlagDocumenter(ClassDocumenter):
     option_spec["hex"] = bool_option
     option_spec["fill"] = int
 
+    #: Documenter class chosen per (member type, isattr), since members
+    #: of an IntFlag class are all handled alike
+    _documenter_cache: dict[tuple[type, bool], type[Documenter]] = {}
+
     @classmethod
     def can_document_member(cls, 
                             member: Any,
@@ -64,18 +68,23 @@ class IntFlagDocumenter(ClassDocumenter):
         memberdocumenters: list[tuple[Documenter, bool]] = [] 
 
         for (mname, member, isattr) in self.filter_members(members, want_all): 
-            classes = [cls for cls in self.documenters.values() 
-                       if cls.can_document_member(member, mname, isattr, self)] 
-            if not classes: 
-                # don't know how to document this member 
-                continue 
-
-            # prefer the documenter with the highest priority 
-            classes.sort(key = lambda cls: cls.priority) 
+            key = (type(member), isattr)
+            documenter_cls = self._documenter_cache.get(key)
+            if documenter_cls is None:
+                classes = [cls for cls in self.documenters.values() 
+                           if cls.can_document_member(member, mname,
+                                                      isattr, self)] 
+                if not classes: 
+                    # don't know how to document this member 
+                    continue 
+
+                # prefer the documenter with the highest priority 
+                classes.sort(key = lambda cls: cls.priority) 
+                documenter_cls = self._documenter_cache[key] = classes[-1]
             # give explicitly separated module name,so that members 
             # of inner classes can be documented 
             full_mname = self.modname + '::' + '.'.join(self.objpath + [mname]) 
-            documenter = classes[-1](self.directive, full_mname, self.indent) 
+            documenter = documenter_cls(self.directive, full_mname, self.indent) 
             memberdocumenters.append((documenter, isattr, member)) 
                                                      
         member_order = (self.options.member_order
@@ -94,7 +103,13 @@ class IntFlagDocumenter(ClassDocumenter):
         self.env.temp_data['autodoc:class'] = None
 
 
+def clear_documenter_cache(app: Sphinx):
+    IntFlagDocumenter._documenter_cache.clear()
+
+
 def setup(app: Sphinx):
     app.setup_extension("sphinx.ext.autodoc")
+    app.connect("builder-inited", clear_documenter_cache)
     app.add_autodocumenter(IntFlagDocumenter)
+    return {"parallel_read_safe": True, "parallel_write_safe": True}
 
@@ -10,24 +10,26 @@ https://stackoverflow.com/questions/61719978/how-to-link-typing-like-nested-clas
 
 """
 
-_cache = {}
+# target -> (uri, display name), resolved once per build
+_resolved = {}
 
 def fill_cache(app):
-    if app.config.reflinks:
-        _cache.update(app.config.reflinks)
+    _resolved.clear()
+    for target, uri in (app.config.reflinks or {}).items():
+        name = target
+        if name in app.config.reflinks_should_replace:
+            name = app.config.reflinks_should_replace[name]
+        if name in app.config.reflinks_should_trim:
+            name = name[name.rindex('.') + 1:]
+        _resolved[target] = (uri, name.replace('_', ' '))
 
 def missing_reference(app, env, node, contnode):
-    target = node['reftarget']
-    uri = _cache.get(target, None)
-    if uri is None:
+    hit = _resolved.get(node['reftarget'])
+    if hit is None:
         return
+    uri, name = hit
     newnode = nodes.reference('', '', internal=False, refuri=uri)
     if not node.get('refexplicit'):
-        if target in app.config.reflinks_should_replace:
-            target = app.config.reflinks_should_replace[target]
-        if target in app.config.reflinks_should_trim:
-            target = target[target.rindex('.') + 1:]
-        name = target.replace('_', ' ')
         contnode = contnode.__class__(name, name)
     newnode.append(contnode)
     return newnode
@@ -38,4 +40,5 @@ def setup(app):
     app.add_config_value("reflinks_should_replace", {}, "html", [dict])
     app.connect('builder-inited', fill_cache)
     app.connect('missing-reference', missing_reference, priority = 1000)
+    return {"parallel_read_safe": True, "parallel_write_safe": True}
 
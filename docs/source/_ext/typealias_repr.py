@@ -0,0 +1,19 @@
+from sphinx.application import Sphinx
+from sphinx.util import inspect
+
+
+def _repr(self: inspect.TypeAliasForwardRef) -> str:
+    return self.name
+
+
+def _hash(self: inspect.TypeAliasForwardRef) -> int:
+    return hash(self.name)
+
+
+def setup(app: Sphinx):
+    """Patch TypeAliasForwardRef for nested type aliases. Done here
+       rather than in conf.py so the config namespace stays free of
+       unpicklable lambdas."""
+    inspect.TypeAliasForwardRef.__repr__ = _repr
+    inspect.TypeAliasForwardRef.__hash__ = _hash
+    return {"parallel_read_safe": True, "parallel_write_safe": True}
@@ -2,11 +2,6 @@
 
 # -- Environment setup ------------------------------------------------------
 
-# Patch TypeAliasForwardRef for nested type aliases
-from sphinx.util import inspect
-inspect.TypeAliasForwardRef.__repr__ = lambda self: self.name
-inspect.TypeAliasForwardRef.__hash__ = lambda self: hash(self.name)
-
 # Add lookup for custom extensions
 import sys
 import os
@@ -26,7 +21,8 @@ extensions = [
     "sphinx.ext.autodoc",
     "sphinx.ext.intersphinx",
     "autodoc_intflag",
-    "reflinks"
+    "reflinks",
+    "typealias_repr"
 ]
 
 templates_path = ['_templates']
@@ -1,6 +1,6 @@
 #!/usr/bin/env python
 from __future__ import annotations
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Callable
 from pathlib import Path
 import struct
@@ -10,12 +10,33 @@ from . import EventType, WatchDescriptor
 ISDIR     = 0x4000_0000
 UNMOUNTED = 0x0000_2000
 
-@dataclass(frozen=True)
+# Fixed-size header of a raw inotify_event struct (wd, mask, cookie, len)
+_HEADER = struct.Struct("@iIII")
+_HEADER_SIZE = _HEADER.size
+
+# Plain int mask; int & IntFlag would defer to the pure Python Flag.__rand__
+_ALL = int(EventType.ALL)
+
+# EventType_ members by value. Composite values are added on first use,
+# skipping the (comparatively slow) EventType.__call__ for repeat values
+_EVENT_TYPES: dict[int, EventType] = {
+        int(t): t for t in EventType.__members__.values()}
+
+
+def _event_type(value: int) -> EventType:
+    """Return the EventType_ for *value*, caching it for next time"""
+    type = _EVENT_TYPES.get(value)
+    if type is None:
+        type = _EVENT_TYPES[value] = EventType(value)
+    return type
+
+
+@dataclass(frozen=True, slots=True)
 class Event:
     """Events_ port an inotify_event struct into a Python class,
        with some additional attributes.
 
-       :note: An Event_ is a frozen :py:func:`~dataclasses.dataclass`
+       :note: An Event_ is a frozen, slotted :py:func:`~dataclasses.dataclass`
        :raises dataclasses.FrozenInstanceError: 
             Upon attempted attribute change
     """
@@ -29,13 +50,48 @@ class Event:
     cookie: int            #: Corresponding inotify cookie
     file_name: str         #: File name that caused this Event_
 
-    #: :class:`~pathlib.Path` to the file that caused this Event_
-    file_path: Path       
+    #: :class:`~pathlib.Path` to the file that caused this Event_.
+    #: For Events_ read from inotify it is only built on first access.
+    file_path: Path
+
+    #: :class:`~pathlib.Path` of the watch that generated this Event_,
+    #: or :data:`None` if not known
+    watch_path: Path | None = field(default=None, repr=False, compare=False)
+
+    @classmethod
+    def _from_watch(cls,
+                    watch_descriptor: WatchDescriptor,
+                    type: EventType,
+                    is_directory: bool,
+                    unmounted: bool,
+                    cookie: int,
+                    file_name: str,
+                    watch_path: Path) -> Event:
+        """Create an Event_ leaving *file_path* unset, to be joined from
+           *watch_path* and *file_name* by :meth:`__getattr__` if needed"""
+        event = object.__new__(cls)
+        setattr = object.__setattr__
+        setattr(event, "watch_descriptor", watch_descriptor)
+        setattr(event, "type", type)
+        setattr(event, "is_directory", is_directory)
+        setattr(event, "unmounted", unmounted)
+        setattr(event, "cookie", cookie)
+        setattr(event, "file_name", file_name)
+        setattr(event, "watch_path", watch_path)
+        return event
+
+    def __getattr__(self, name: str):
+        """Only called for unset slots: build and cache *file_path*"""
+        if name != "file_path":
+            raise AttributeError(name)
+        file_path = self.watch_path / self.file_name
+        object.__setattr__(self, "file_path", file_path)
+        return file_path
 
     @staticmethod
     def from_buffer(
             wd_to_path: Callable[ [WatchDescriptor], Path],
-            buffer: bytes, 
+            buffer: bytes | memoryview,
             offset: int = 0) -> tuple[Event, int]:
         """Starting at *offset*, unpack *buffer* to create 
            an Event_ object.
@@ -48,23 +104,25 @@ class Event:
            :return: :class:`tuple` of the new Event_ and new *offset*
         """
         # Unpack raw inotify_event struct
-        wd, mask, cookie, _len = struct.unpack_from("@iIII", buffer, offset)
-        offset += struct.calcsize("@iIII")
-        file_name, = struct.unpack_from(f"@{_len}s", buffer, offset)
-        offset += struct.calcsize(f"@{_len}s")
-        
+        wd, mask, cookie, _len = _HEADER.unpack_from(buffer, offset)
+        offset += _HEADER_SIZE
+        if len(buffer) - offset < _len:
+            raise struct.error(f"name of {_len} bytes exceeds buffer at "
+                               f"offset {offset}")
+        file_name = bytes(buffer[offset:offset + _len])
+        offset += _len
+
         # Process into Event attributes        
-        file_name = file_name.strip(b'\0').decode()
-        file_path = wd_to_path(wd) / file_name
-        type = EventType(mask & EventType.ALL)
+        file_name = file_name.rstrip(b'\0').decode()
+        watch_path = wd_to_path(wd)
+        type = _event_type(mask & _ALL)
 
         is_dir = (mask & ISDIR) != 0
         unmounted = (mask & UNMOUNTED) != 0
         
         # Create and return
-        event = Event(watch_descriptor=wd, type=type,
-                      is_directory=is_dir, unmounted=unmounted,
-                      cookie=cookie, file_name=file_name, file_path=file_path)
+        event = Event._from_watch(wd, type, is_dir, unmounted,
+                                  cookie, file_name, watch_path)
 
         return event, offset
 
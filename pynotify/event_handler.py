@@ -22,6 +22,9 @@ class EventHandler(Protocol):
         """A method required by a Notifier_ to query this EventHandler_
            on whether it can handle the provided EventType_ *type*
 
+           .. note:: The answer is cached per watch and EventType_ until
+                     the EventHandlers_ of the watch change
+
            :param type: EventType_ to be handled
 
            :return bool: :data:`True` if this EventHandler_ can handle the 
@@ -4,20 +4,22 @@ import asyncio
 import warnings
 import ctypes
 import errno
+import functools
 import os
 
 from ctypes import c_int, c_uint, c_char_p
 from ctypes.util import find_library
 
-from fcntl import ioctl
-from termios import FIONREAD
 from signal import SIGINT
 
+from collections import deque
 from pathlib import Path
 
 from typing import AsyncIterable
 
 from . import Event, EventType, EventHandler, WatchDescriptor
+from .event import (_HEADER, _HEADER_SIZE, _ALL, _EVENT_TYPES, _event_type,
+                    ISDIR, UNMOUNTED)
 
 
 ONLYDIR     = 24  # shift for 0x0100_0000
@@ -27,6 +29,19 @@ ONESHOT     = 31  # shift for 0x8000_0000
 
 MASK_ADD    = 29  # shift for 0x2000_0000
 
+IN_NONBLOCK = os.O_NONBLOCK  # inotify_init1 flag
+IN_CLOEXEC  = os.O_CLOEXEC   # inotify_init1 flag
+
+_ONLYDIR_BIT     = 1 << ONLYDIR
+_DONT_FOLLOW_BIT = 1 << DONT_FOLLOW
+_EXCL_UNLINK_BIT = 1 << EXCL_UNLINK
+_ONESHOT_BIT     = 1 << ONESHOT
+_MASK_ADD_BIT    = 1 << MASK_ADD
+
+# Bytes read from the inotify fd at once; fits 240 maximum-size events
+# (sizeof(struct inotify_event) + NAME_MAX + 1 each)
+READ_BUFFER_SIZE = 64 * 1024
+
 
 def load_libc(path: str | None = None) -> ctypes.CDLL:
     """Load libc and return a ctypes.CDLL.
@@ -36,10 +51,17 @@ def load_libc(path: str | None = None) -> ctypes.CDLL:
        :raises FileNotFoundError: When libc can't be found
     """
     if path is None:
-        path = find_library("c")
+        path = _find_libc()
     if path is None:
         raise FileNotFoundError("Could not find libc!")
-    return ctypes.CDLL(path)
+    return ctypes.CDLL(path, use_errno=True)
+
+
+@functools.cache
+def _find_libc() -> str | None:
+    """Locate libc once; :func:`~ctypes.util.find_library` spawns
+       helper processes on every call."""
+    return find_library("c")
 
 
 class Notifier:
@@ -48,23 +70,32 @@ class Notifier:
     def __init__(self, 
                  async_loop: asyncio.AbstractEventLoop | None = None,
                  libc_path: Path | None = None):
-        self._libc = load_libc(str(libc_path))
+        self._libc = load_libc(None if libc_path is None else str(libc_path))
         self._define_inotify_functions()
 
         self._loop = async_loop if async_loop else asyncio.get_running_loop()
-        self._wd_paths: dict[WatchDescriptor|Path, Path|WatchDescriptor] = {}
-        self._queue: asyncio.Queue[Event] = asyncio.Queue()
+        self._wd_to_path: dict[WatchDescriptor, Path] = {}
+        self._path_to_wd: dict[Path, WatchDescriptor] = {}
+        self._path_bytes: dict[WatchDescriptor, bytes] = {}
+        self._events: deque[Event] = deque()
+        self._events_ready = asyncio.Event()
         self._handlers: dict[WatchDescriptor, set[EventHandler]] = {}
+        self._dispatch: dict[WatchDescriptor,
+                             dict[EventType, tuple[EventHandler, ...]]] = {}
+        # Set while run(warn_unhandled=False) is running: drop Events_ no
+        # handler can handle before creating them, instead of warning after
+        self._skip_unhandled = False
 
         self._fd = self._inotify_init()
+        self._read_buffer = bytearray(READ_BUFFER_SIZE)
         self._loop.add_reader(self._fd, self._on_fd_ready_to_read) 
 
     def _define_inotify_functions(self):
         """Define inotify functions from libc as required by ctypes.
            Note that return values are error-checked by the
            _handle_inotify_return method."""
-        self._libc.inotify_init.restype = self._handle_inotify_return
-        self._libc.inotify_init.argtypes = tuple()
+        self._libc.inotify_init1.restype = self._handle_inotify_return
+        self._libc.inotify_init1.argtypes = (c_int,)
 
         self._libc.inotify_add_watch.restype = self._handle_inotify_return
         self._libc.inotify_add_watch.argtypes = (c_int, c_char_p, c_uint)
@@ -83,9 +114,9 @@ class Notifier:
         return value
 
     def _inotify_init(self) -> int:
-        """Initializes a new inotify instance and returns a
+        """Initializes a new inotify instance and returns a non-blocking
            file descriptor associated with the new inotify event queue."""
-        return self._libc.inotify_init()
+        return self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
 
     def _on_fd_ready_to_read(self):
         """Callback method when the asyncio loop determines that the
@@ -93,29 +124,69 @@ class Notifier:
         raw_data = self._read_from_fd()
         self._create_and_put_events(raw_data)
 
-    def _read_from_fd(self) -> bytes:
-        """Read and return all bytes available on the file descriptor.
+    def _read_from_fd(self) -> bytes | memoryview:
+        """Read available bytes from the file descriptor into the
+           preallocated read buffer.
 
-           :return: raw :class:`bytes` from the file descriptor
+           :return: :class:`memoryview` of the bytes read, only valid until
+                    the next read
         """
-        available = c_int()
         try:
-            ioctl(self._fd, FIONREAD, available)
-        except OSError:  # happens if last watch is removed 
+            count = os.readv(self._fd, (self._read_buffer,))
+        except BlockingIOError:  # nothing left to read
             return b""
-        return os.read(self._fd, available.value)
-    
-    def _create_and_put_events(self, raw_data: bytes):
+        return memoryview(self._read_buffer)[:count]
+
+    def _create_and_put_events(self, raw_data: bytes | memoryview):
         """Deserialize Event objects from the raw data and put
-           the Event on the queue.
+           them on the event deque, waking :func:`Notifier.run` once.
 
            :param raw_data: The raw bytes to convert to Events_
         """
+        # Same decoding as Event.from_buffer, inlined with everything
+        # hoisted into locals since this runs for every inotify record
+        buffer = memoryview(raw_data)
+        end = len(buffer)
+        unpack_from = _HEADER.unpack_from
+        wd_paths = self._wd_to_path
+        dispatch = self._dispatch
+        skip_unhandled = self._skip_unhandled
+        put = self._events.append
+        new_event = Event._from_watch
+        types = _EVENT_TYPES
+        ALL = _ALL
+
         offset = 0
-        while offset != len(raw_data):
-            event, offset = Event.from_buffer(
-                    self.watch_descriptor_to_path, raw_data, offset)
-            self._queue.put_nowait(event)
+        while offset < end:
+            wd, mask, cookie, _len = unpack_from(buffer, offset)
+            offset += _HEADER_SIZE
+            wd_dispatch = dispatch.get(wd)
+            if wd_dispatch is None:  # watch was removed, e.g. IN_IGNORED
+                offset += _len
+                continue
+
+            type = types.get(mask & ALL)
+            if type is None:
+                type = _event_type(mask & ALL)
+            if skip_unhandled:
+                handlers = wd_dispatch.get(type)
+                if handlers is None:
+                    handlers = self._capable_handlers(wd, type)
+                if not handlers:
+                    offset += _len
+                    continue
+
+            if _len:
+                file_name = bytes(buffer[offset:offset + _len]).rstrip(b'\0')
+                file_name = file_name.decode()
+                offset += _len
+            else:  # events on the watched file itself carry no name
+                file_name = ""
+            put(new_event(wd, type,
+                          (mask & ISDIR) != 0, (mask & UNMOUNTED) != 0,
+                          cookie, file_name, wd_paths[wd]))
+        if self._events:
+            self._events_ready.set()
     
     def watch_descriptor_to_path(self,
             watch_descriptor: WatchDescriptor) -> Path:
@@ -124,7 +195,26 @@ class Notifier:
            :param watch_descriptor: The WatchDescriptor_ to convert to a 
                                     :class:`Path`
         """
-        return self._wd_paths[watch_descriptor]
+        return self._wd_to_path[watch_descriptor]
+
+    def _resolve(self, descriptor: Path | WatchDescriptor
+                 ) -> tuple[WatchDescriptor, Path]:
+        """Return the WatchDescriptor_ and :class:`Path` of the watch
+           on *descriptor*.
+
+           :param descriptor: A :class:`Path` or WatchDescriptor_ of a watch
+
+           :raises ValueError: If there is no watch on *descriptor*
+        """
+        if isinstance(descriptor, Path):
+            file_path = descriptor.expanduser()
+            wd = self._path_to_wd.get(file_path)
+        else:
+            wd = descriptor
+            file_path = self._wd_to_path.get(wd)
+        if wd is None or file_path is None:
+            raise ValueError(f"No watch on descriptor '{descriptor}'!")
+        return wd, file_path
 
     def add_watch(self,
                   file_path: Path,
@@ -166,21 +256,23 @@ class Notifier:
         file_path = file_path.expanduser()
         if not file_path.exists():
             raise FileNotFoundError(f"Cannot find file: {file_path}")
-        if file_path in self._wd_paths:
+        if file_path in self._path_to_wd:
             raise ValueError(f"File '{file_path}' already has a watch!")
 
         bytes_path = str(file_path).encode()
 
-        mask = (   only_event_types 
-                | (follow_symlinks << DONT_FOLLOW)
-                | (if_directory_only << ONLYDIR)
-                | (exclude_unlinks << EXCL_UNLINK)
-                | (oneshot << ONESHOT) )
+        mask = (   only_event_types
+                | (_DONT_FOLLOW_BIT if follow_symlinks else 0)
+                | (_ONLYDIR_BIT if if_directory_only else 0)
+                | (_EXCL_UNLINK_BIT if exclude_unlinks else 0)
+                | (_ONESHOT_BIT if oneshot else 0) )
 
         wd = self._libc.inotify_add_watch(self._fd, bytes_path, mask)
-        self._wd_paths[wd] = file_path
-        self._wd_paths[file_path] = wd
+        self._wd_to_path[wd] = file_path
+        self._path_to_wd[file_path] = wd
+        self._path_bytes[wd] = bytes_path
         self._handlers[wd] = set(handlers)
+        self._dispatch[wd] = {}
 
     def modify_watch_event_types(self,
                                  descriptor: Path | WatchDescriptor,
@@ -200,20 +292,11 @@ class Notifier:
            :raises ValueError: If there is no watch on *descriptor*
 
         """
-        if isinstance(descriptor, Path):
-            descriptor = descriptor.expanduser()
-
-        if descriptor not in self._wd_paths:
-            raise ValueError(f"No watch on descriptor '{descriptor}'!")
-        
-        if isinstance(descriptor, Path):
-            file_path = descriptor
-        else:
-            file_path = self._wd_paths[descriptor]
-        bytes_path = str(file_path).encode()
+        wd, _ = self._resolve(descriptor)
+        bytes_path = self._path_bytes[wd]
 
         # inotify_add_watch also modifies existing watch masks
-        mask = new_types | (merge << MASK_ADD)
+        mask = new_types | (_MASK_ADD_BIT if merge else 0)
         _ = self._libc.inotify_add_watch(self._fd, bytes_path, mask)
 
     def remove_watch(self, 
@@ -227,18 +310,18 @@ class Notifier:
 
            :raises ValueError: If *raises* and there is no watch on *descriptor*
         """
-        if isinstance(descriptor, Path):
-            descriptor = descriptor.expanduser()
-        if descriptor not in self._wd_paths:
+        try:
+            wd, file_path = self._resolve(descriptor)
+        except ValueError:
             if raises:
-                raise ValueError(f"No watch on descriptor '{descriptor}'!")
+                raise
             return
-        
-        wd = self._wd_paths.pop(descriptor)
-        del self._wd_paths[wd]
 
-        if isinstance(wd, Path):
-            wd = descriptor
+        del self._wd_to_path[wd]
+        del self._path_to_wd[file_path]
+        del self._path_bytes[wd]
+        del self._handlers[wd]
+        del self._dispatch[wd]
 
         self._libc.inotify_rm_watch(self._fd, wd)
 
@@ -252,10 +335,12 @@ class Notifier:
            :param descriptor: A :class:`Path` or WatchDescriptor_ to add
                               *handlers* to
            :param handlers: New EventHandlers_ to add to *descriptor*
+
+           :raises ValueError: If there is no watch on *descriptor*
         """
-        if isinstance(descriptor, Path):
-            descriptor = self._wd_paths[descriptor]
-        self._handlers[descriptor] |= set(handlers)
+        wd, _ = self._resolve(descriptor)
+        self._handlers[wd] |= set(handlers)
+        self._dispatch[wd].clear()
 
     def clear_handlers(self, descriptor: Path | WatchDescriptor):
         """Clear all EventHandlers_ for the watch on *descriptor*
@@ -265,11 +350,9 @@ class Notifier:
 
            :raises ValueError: If there is no watch on *descriptor*
         """
-        if descriptor not in self._wd_paths:
-            raise ValueError(f"No watch on descriptor '{descriptor}'!")
-        if isinstance(descriptor, Path):
-            descriptor = self._wd_paths[descriptor]
-        self._handlers[descriptor].clear()
+        wd, _ = self._resolve(descriptor)
+        self._handlers[wd].clear()
+        self._dispatch[wd].clear()
 
     def remove_handlers(self,
                         descriptor: Path | WatchDescriptor,
@@ -282,11 +365,19 @@ class Notifier:
 
            :raises ValueError: If there is no watch on *descriptor*
         """
-        if descriptor not in self._wd_paths:
-            raise ValueError("No watch on descriptor '{descriptor}'!")
-        if isinstance(descriptor, Path):
-            descriptor = self._wd_paths[descriptor]
-        self._handlers[descriptor] -= set(handlers)
+        wd, _ = self._resolve(descriptor)
+        self._handlers[wd] -= set(handlers)
+        self._dispatch[wd].clear()
+
+    def _capable_handlers(self,
+                          wd: WatchDescriptor,
+                          type: EventType) -> tuple[EventHandler, ...]:
+        """Return the EventHandlers_ on the watch *wd* that can handle
+           *type*, caching the result until the watch's handlers change."""
+        handlers = tuple(handler for handler in self._handlers[wd]
+                         if handler.can_handle_event_type(type))
+        self._dispatch[wd][type] = handlers
+        return handlers
 
     async def run(self, 
                   stop_event: asyncio.Event | None = None,
@@ -303,23 +394,53 @@ class Notifier:
                                discarded after it is handled by the first
                                capable EventHandler_.
            :param warn_unhandled: Emit a warning via :func:`warnings.warn`
-                                  if an Event_ is not handled.
+                                  if an Event_ is not handled. Otherwise
+                                  such Events_ are discarded as they are
+                                  read, without being created.
         """
-        while stop_event is None or not stop_event.is_set():
-            event = await self._queue.get()
-            handled = False
-            for handler in self._handlers[event.watch_descriptor]:
-                if not handler.can_handle_event_type(event.type):
+        self._skip_unhandled = not warn_unhandled
+        try:
+            events = self._events
+            dispatch = self._dispatch
+            while stop_event is None or not stop_event.is_set():
+                if not events:
+                    await self._wait_for_events(stop_event)
+                    continue
+                event = events.popleft()
+                wd = event.watch_descriptor
+                if wd not in dispatch:  # watch removed since it was read
                     continue
-                handler.handle_event(event)
-                handled = True
-                if handle_once:
-                    break
-            if warn_unhandled and not handled:
-                warnings.warn("Unhandled Event! {event}", RuntimeWarning)
+                handlers = dispatch[wd].get(event.type)
+                if handlers is None:
+                    handlers = self._capable_handlers(wd, event.type)
+                if handlers:
+                    if handle_once:
+                        handlers[0].handle_event(event)
+                    else:
+                        for handler in handlers:
+                            handler.handle_event(event)
+                elif warn_unhandled:
+                    warnings.warn(f"Unhandled Event! {event}", RuntimeWarning)
+        finally:
+            self._skip_unhandled = False
+
+    async def _wait_for_events(self, stop_event: asyncio.Event | None):
+        """Wait until Events_ are ready or *stop_event* is set"""
+        self._events_ready.clear()
+        if stop_event is None:
+            await self._events_ready.wait()
+            return
+        waiters = {asyncio.ensure_future(self._events_ready.wait()),
+                   asyncio.ensure_future(stop_event.wait())}
+        try:
+            await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for waiter in waiters:
+                waiter.cancel()
 
     def close(self):
-        """Close the inotify fd"""
+        """Stop watching the inotify fd on the loop and close it"""
+        self._loop.remove_reader(self._fd)
         os.close(self._fd)
 
     def __enter__(self):
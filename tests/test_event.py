@@ -2,10 +2,11 @@
 import unittest
 
 import struct
+import dataclasses
 
 from pathlib import Path
 
-from pynotify import Event
+from pynotify import Event, EventType
 
 
 def wd_to_path(wd: int):
@@ -34,6 +35,30 @@ class Test_Event(unittest.TestCase):
         self.assertEqual(e.file_name, "")
         self.assertEqual(e.file_path, "")
     
+    def test_lazy_file_path(self):
+        e = Event._from_watch(0, EventType.CREATE, False, False, 0,
+                              "test", Path.cwd())
+        self.assertEqual(e.watch_path, Path.cwd())
+        self.assertEqual(e.file_path, Path.cwd() / "test")
+        self.assertIs(e.file_path, e.file_path)
+        self.assertEqual(e, Event(0, EventType.CREATE, False, False, 0,
+                                  "test", Path.cwd() / "test"))
+
+    def test_lazy_file_path_dataclass_helpers(self):
+        e = Event._from_watch(0, EventType.CREATE, False, False, 0,
+                              "test", Path.cwd())
+        self.assertEqual(dataclasses.asdict(e)["file_path"],
+                         Path.cwd() / "test")
+        self.assertIn("file_path=", repr(e))
+        moved = dataclasses.replace(e, file_path=Path("/moved"))
+        self.assertEqual(moved.file_path, Path("/moved"))
+
+    def test_frozen_slots(self):
+        e = Event(0, 0, False, False, 0, "", Path.cwd())
+        self.assertFalse(hasattr(e, "__dict__"))
+        with self.assertRaises(dataclasses.FrozenInstanceError):
+            e.cookie = 1
+
     def test_empty_buffer(self):
         with self.assertRaises(struct.error):
             Event.from_buffer(wd_to_path, b"", 0)
@@ -56,6 +81,20 @@ class Test_Event(unittest.TestCase):
         self.assertEqual(offset, 255 + 16)
         self.assertEqual(e.file_name, "test")
 
+    def test_composite_type(self):
+        buffer = struct.pack("@iIII", 0, 0x018, 0, 0)
+        e, _ = Event.from_buffer(wd_to_path, buffer, 0)
+        self.assertIs(e.type, EventType.CLOSE)
+        buffer = struct.pack("@iIII", 0, 0x006, 0, 0)
+        e, _ = Event.from_buffer(wd_to_path, buffer, 0)
+        self.assertEqual(e.type, EventType.MODIFY | EventType.ATTRIB)
+
+    def test_memoryview_buffer(self):
+        buffer = struct.pack("@iIII8s", 1, 0x100, 0, 8, b"test")
+        e, offset = Event.from_buffer(wd_to_path, memoryview(buffer), 0)
+        self.assertEqual(offset, len(buffer))
+        self.assertEqual(e.file_name, "test")
+
 
 if __name__ == "__main__":
     unittest.main()
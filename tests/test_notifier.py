@@ -1,25 +1,49 @@
 #!/usr/bin/env python
 import unittest
-from unittest.mock import patch
+import array
 import asyncio
+import ctypes
 import struct
+import os
+import sys
 import pathlib
 from pynotify import Notifier, Event, EventType
+import pynotify.notifier as notifier_module
 
 
 class TestHandler:
-    def __init__(self):
-        self.handled_events = []
+    """Records handled Events column-wise, so large batches of Events
+       aren't all kept alive"""
+    def __init__(self, types: EventType = EventType.ALL):
+        self.mask = int(types)
+        self.watch_descriptors = array.array("i")
+        self.types = array.array("I")
+        self.cookies = array.array("I")
+        self.file_names: list[str] = []
 
     def handle_event(self, event: Event):
-        self.handled_events.append(event)
+        self.watch_descriptors.append(event.watch_descriptor)
+        self.types.append(event.type)
+        self.cookies.append(event.cookie)
+        self.file_names.append(event.file_name)
 
     def can_handle_event_type(self, event_type: EventType) -> bool:
-        return event_type & EventType.ALL != 0
+        return event_type & self.mask != 0
+
+
+_CWD = pathlib.Path.cwd()
 
 
 def wd_to_path(wd: int):
-    return pathlib.Path.cwd()
+    return _CWD
+
+
+def stub(test: unittest.TestCase, target: object, name: str, value: object):
+    """Set *target.name* to *value* until *test* finishes. A plain
+       attribute swap, much cheaper than unittest.mock.patch"""
+    original = getattr(target, name)
+    setattr(target, name, value)
+    test.addCleanup(setattr, target, name, original)
 
 
 class Test_Notifier_ctors(unittest.IsolatedAsyncioTestCase):
@@ -37,44 +61,136 @@ class Test_Notifier_ctors(unittest.IsolatedAsyncioTestCase):
         n.close()
 
     async def test_no_libc(self):
-        with patch("pynotify.notifier.find_library", return_value=None):
-            with self.assertRaises(FileNotFoundError):
-                Notifier()
+        stub(self, notifier_module, "_find_libc", lambda: None)
+        with self.assertRaises(FileNotFoundError):
+            Notifier()
+
+    async def test_close_removes_reader(self):
+        loop = asyncio.get_running_loop()
+        n = Notifier()
+        fd = n._fd
+        n.close()
+        self.assertFalse(loop.remove_reader(fd))
 
     async def test_bad_libc(self):
         with self.assertRaises(OSError):
             Notifier(libc_path="it/would/never/be/here/normally/libc.so")
 
 
-class Test_Notifier(unittest.IsolatedAsyncioTestCase):
-    async def asyncSetUp(self):
-        self.notifier = Notifier()
-        self.cwd = pathlib.Path.cwd()
+class Test_Notifier(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # None of these tests await, so the Notifier only needs a loop to
+        # register its reader with, not a running one
+        cls.loop = asyncio.new_event_loop()
+        cls.notifier = Notifier(async_loop=cls.loop)
 
-    async def asyncTearDown(self):
-        self.notifier.close()
+    @classmethod
+    def tearDownClass(cls):
+        cls.notifier.close()
+        cls.loop.close()
+
+    def setUp(self):
+        self.cwd = _CWD
+        self.addCleanup(self.reset_notifier)
+
+    def reset_notifier(self):
+        """Remove the test's watch and anything it left to be read"""
+        self.notifier.remove_watch(self.cwd, raises=False)
+        while self.notifier._read_from_fd():
+            pass
+        self.notifier._events.clear()
+        self.notifier._events_ready.clear()
 
     def test_define_inotify_functions(self):
         self.notifier._define_inotify_functions()
     
-    @patch("pynotify.notifier.ctypes.get_errno")
-    def test_handle_inotify_return_throws(self, get_errno):
-        get_errno.return_value = 3
+    def test_handle_inotify_return_throws(self):
+        stub(self, ctypes, "get_errno", lambda: 3)
         with self.assertRaises(RuntimeError):
             self.notifier._handle_inotify_return(-1)
 
+    def test_inotify_error_sets_errno(self):
+        with self.assertRaisesRegex(RuntimeError, "EINVAL"):
+            self.notifier._libc.inotify_rm_watch(self.notifier._fd, 12345)
+
+    def test_fd_non_blocking(self):
+        self.assertFalse(os.get_blocking(self.notifier._fd))
+        self.assertFalse(os.get_inheritable(self.notifier._fd))
+
     def test_handle_inotify_return_valid(self):
-        for i in range(10):
-            with self.subTest(i=i):
-                self.assertEqual(i, self.notifier._handle_inotify_return(i))
+        self.assertEqual(list(range(10)),
+                [self.notifier._handle_inotify_return(i) for i in range(10)])
     
-    @patch("pynotify.notifier.Notifier._read_from_fd")
-    def test_no_data_ready_on_fd(self, mocked_method):
-        mocked_method.return_value = b""
+    def test_no_data_ready_on_fd(self):
+        stub(self, self.notifier, "_read_from_fd", lambda: b"")
         self.notifier._on_fd_ready_to_read()
 
-        with self.assertRaises(asyncio.QueueEmpty):
-            self.notifier._queue.get_nowait()
+        self.assertFalse(self.notifier._events)
+        self.assertFalse(self.notifier._events_ready.is_set())
+
+    def test_create_and_put_events(self):
+        self.notifier.add_watch(self.cwd)
+        wd = self.notifier._path_to_wd[self.cwd]
+        raw_data = (struct.pack("@iIII8s", wd, 0x4000_0100, 0, 8, b"test")
+                  + struct.pack("@iIII", wd, 0x002, 7, 0))
+        self.notifier._create_and_put_events(raw_data)
+        self.assertTrue(self.notifier._events_ready.is_set())
+
+        e = self.notifier._events.popleft()
+        self.assertEqual(e.type, EventType.CREATE)
+        self.assertTrue(e.is_directory)
+        self.assertEqual(e.file_name, "test")
+        self.assertEqual(e.file_path, self.cwd / "test")
+
+        e = self.notifier._events.popleft()
+        self.assertEqual(e.type, EventType.MODIFY)
+        self.assertFalse(e.is_directory)
+        self.assertEqual(e.cookie, 7)
+        self.assertEqual(e.file_path, self.cwd)
+
+    def test_read_from_fd_empty(self):
+        self.assertEqual(self.notifier._read_from_fd(), b"")
+
+    def test_read_from_fd(self):
+        self.notifier.add_watch(self.cwd)
+        os.listdir(self.cwd)  # generates OPEN, ACCESS and CLOSE_NOWRITE
+        raw_data = self.notifier._read_from_fd()
+        self.assertIsInstance(raw_data, memoryview)
+        self.assertGreater(len(raw_data), 0)
+
+    def test_batched_event_parse(self):
+        self.notifier.add_watch(self.cwd)
+        wd = self.notifier._path_to_wd[self.cwd]
+        count = 1000
+        raw_data = b"".join(struct.pack("@iIII", wd, 0x002, cookie, 0)
+                            for cookie in range(count))
+        self.notifier._create_and_put_events(raw_data)
+
+        events = self.notifier._events
+        self.assertEqual(len(events), count)
+        self.assertEqual([e.cookie for e in events], list(range(count)))
+        self.assertTrue(all(e.type is EventType.MODIFY for e in events))
+
+    def test_skip_unhandled_events(self):
+        handler = TestHandler(EventType.CREATE)
+        self.notifier.add_watch(self.cwd, handler)
+        wd = self.notifier._path_to_wd[self.cwd]
+        stub(self, self.notifier, "_skip_unhandled", True)
+        self.notifier._create_and_put_events(
+                  struct.pack("@iIII8s", wd, 0x002, 0, 8, b"test")
+                + struct.pack("@iIII8s", wd, 0x100, 0, 8, b"test"))
+
+        self.assertEqual(len(self.notifier._events), 1)
+        self.assertEqual(self.notifier._events[0].type, EventType.CREATE)
+
+    def test_removed_watch_events_dropped(self):
+        self.notifier.add_watch(self.cwd)
+        wd = self.notifier._path_to_wd[self.cwd]
+        self.notifier.remove_watch(self.cwd)
+        self.notifier._create_and_put_events(
+                struct.pack("@iIII", wd, 0x8000, 0, 0))  # IN_IGNORED
+        self.assertFalse(self.notifier._events)
 
     def test_add_watch(self):
         self.notifier.add_watch(self.cwd)
@@ -94,9 +210,7 @@ class Test_Notifier(unittest.IsolatedAsyncioTestCase):
         self.notifier.add_watch(self.cwd)
         self.notifier.modify_watch_event_types(self.cwd, EventType.MOVED)
     
-    @patch("pynotify.notifier.ioctl")
-    def test_remove_watch(self, mocked_method):
-        mocked_method.return_value = 0
+    def test_remove_watch(self):
         self.notifier.add_watch(self.cwd)
         self.notifier.remove_watch(self.cwd)
 
@@ -118,16 +232,94 @@ class Test_Notifier(unittest.IsolatedAsyncioTestCase):
         self.notifier.add_handlers(self.cwd, handler)
         self.notifier.add_handlers(self.cwd, handler)
 
+    def test_add_handlers_no_watch(self):
+        with self.assertRaises(ValueError):
+            self.notifier.add_handlers(self.cwd, TestHandler())
+
     def test_remove_handler(self):
         handler = TestHandler()
         self.notifier.add_watch(self.cwd)
         self.notifier.add_handlers(self.cwd, handler)
         self.notifier.remove_handlers(self.cwd, handler)
 
+
+class Test_Notifier_run(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.notifier = Notifier()
+        self.cwd = _CWD
+        self.notifier.add_watch(self.cwd)
+        self.wd = self.notifier._path_to_wd[self.cwd]
+
+    async def asyncTearDown(self):
+        self.notifier.close()
+
+    async def run_until_drained(self, raw_data: bytes, **run_kwargs):
+        """Queue *raw_data* as if read from the inotify fd, then run the
+           Notifier until all of it has been dispatched"""
+        stop_event = asyncio.Event()
+        self.notifier._create_and_put_events(raw_data)
+        task = asyncio.create_task(self.notifier.run(stop_event, **run_kwargs))
+        await asyncio.sleep(0)
+        stop_event.set()
+        await asyncio.wait_for(task, timeout=1)
+
     async def test_run(self):
         with self.assertRaises(asyncio.TimeoutError):
             await asyncio.wait_for(self.notifier.run(), timeout=0.5)
 
+    async def test_run_handles_events(self):
+        handler = TestHandler()
+        self.notifier.add_handlers(self.cwd, handler)
+        await self.run_until_drained(
+                struct.pack("@iIII", self.wd, 0x002, 0, 0) * 3)
+        self.assertEqual(list(handler.types), [EventType.MODIFY] * 3)
+        self.assertEqual(list(handler.watch_descriptors), [self.wd] * 3)
+
+    async def test_run_caches_capable_handlers(self):
+        handler = TestHandler()
+        queries = []
+        def can_handle_event_type(event_type):
+            queries.append(event_type)
+            return True
+        handler.can_handle_event_type = can_handle_event_type
+        self.notifier.add_handlers(self.cwd, handler)
+        await self.run_until_drained(
+                struct.pack("@iIII", self.wd, 0x002, 0, 0) * 3)
+        self.assertEqual(queries, [EventType.MODIFY])
+        self.assertEqual(len(handler.types), 3)
+
+    async def test_run_warns_unhandled(self):
+        with self.assertWarnsRegex(RuntimeWarning, "Unhandled Event! Event"):
+            await self.run_until_drained(
+                    struct.pack("@iIII", self.wd, 0x002, 0, 0))
+
+    async def test_run_skips_unhandled(self):
+        self.notifier.add_handlers(self.cwd, TestHandler(EventType.CREATE))
+        modify = struct.pack("@iIII", self.wd, 0x002, 0, 0)
+        create = struct.pack("@iIII", self.wd, 0x100, 0, 0)
+        stop_event = asyncio.Event()
+        task = asyncio.create_task(
+                self.notifier.run(stop_event, warn_unhandled=False))
+        await asyncio.sleep(0)
+
+        self.notifier._create_and_put_events(modify + create)
+        self.assertEqual([e.type for e in self.notifier._events],
+                         [EventType.CREATE])
+        stop_event.set()
+        await asyncio.wait_for(task, timeout=1)
+
+        # Once run() returns, unhandled records are queued again
+        self.notifier._events.clear()
+        self.notifier._create_and_put_events(modify)
+        self.assertEqual(len(self.notifier._events), 1)
+
+    async def test_stop_event_wakes_run(self):
+        stop_event = asyncio.Event()
+        task = asyncio.create_task(self.notifier.run(stop_event))
+        await asyncio.sleep(0)
+        stop_event.set()
+        await asyncio.wait_for(task, timeout=0.05)
+
     async def test_handle_forever_stop(self):
         stop_event = asyncio.Event()
 
@@ -145,5 +337,15 @@ class Test_Notifier(unittest.IsolatedAsyncioTestCase):
         
 
 if __name__ == "__main__":
-    unittest.main(buffer=True)
+    try:
+        from concurrencytest import ConcurrentTestSuite, fork_for_tests
+    except ImportError:
+        unittest.main(buffer=True)
+    else:
+        # Each forked worker gets its own Notifiers and inotify fds
+        suite = unittest.defaultTestLoader.loadTestsFromModule(
+                sys.modules[__name__])
+        suite = ConcurrentTestSuite(suite, fork_for_tests(os.cpu_count()))
+        result = unittest.TextTestRunner(buffer=True).run(suite)
+        sys.exit(not result.wasSuccessful())
 